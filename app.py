@@ -1,9 +1,8 @@
 from flask import Flask
 from flask_socketio import SocketIO
 from flask_cors import CORS                   
-from config.setting import load_env
-
-load_env()
+from config.setting import FRONTEND_URL, PORT
+from config.cache import cache
 from routes import register_routes
 import os
 
@@ -13,13 +12,14 @@ app.config['SESSION_COOKIE_SECURE'] = True
 app.secret_key = 'super-secret'
 
 # CORS + SocketIO
-socketio = SocketIO(app, cors_allowed_origins=os.environ.get("FRONTEND_URL"))  
-CORS(app, supports_credentials=True, origins=[os.environ.get("FRONTEND_URL")])
+socketio = SocketIO(app, cors_allowed_origins=FRONTEND_URL)  
+CORS(app, supports_credentials=True, origins=[FRONTEND_URL])
 
+cache.init_app(app)
 register_routes(app)
 
+# Local development only; production runs under gunicorn with an eventlet worker (see Procfile)
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT") or 5000) 
-    socketio.run(app, host="0.0.0.0", port=port, debug=True)
+    socketio.run(app, host="0.0.0.0", port=PORT, debug=os.environ.get("FLASK_DEBUG") == "1")
 
 
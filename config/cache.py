@@ -0,0 +1,12 @@
+from flask_caching import Cache
+
+# Shared cache for values that are expensive to recompute (Drive downloads, AI calls).
+# Bound to the app in app.py via cache.init_app(app).
+cache = Cache(config={
+    'CACHE_TYPE': 'FileSystemCache',
+    'CACHE_DIR': '/tmp/fcache',
+    'CACHE_DEFAULT_TIMEOUT': 86400,
+    # FileSystemCache prunes past this many entries (default 500, too few for 100+ file batches);
+    # snippets are ~1-2 KB each, so this stays in the tens of MB on disk
+    'CACHE_THRESHOLD': 20000
+})
@@ -7,3 +7,16 @@ def load_env():
     # key = os.environ.get("OPENAI_API_KEY")
     # if not key or not key.startswith("sk-"):
     #     raise Exception("❌ OPENAI_API_KEY not set correctly in environment")
+
+def require_env(name: str) -> str:
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"❌ {name} not set in environment")
+    return value
+
+# Read the environment once at import so missing settings fail at startup, not mid-request
+load_env()
+
+FRONTEND_URL = require_env("FRONTEND_URL")
+OPENAI_KEY = require_env("OPENAI_KEY")
+PORT = int(os.environ.get("PORT") or 5000)
@@ -1,124 +1,166 @@
 # ai_organizer.py
-import os
+import io
 import json
-from flask import Blueprint, request, jsonify, session
-from googleapiclient.discovery import build
+import functools
+import hashlib
+from flask import Blueprint, request, jsonify, session, current_app
 from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.credentials import Credentials
 from openai import OpenAI
+import httpx
 import re
-from typing import List, Dict, Any
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 
 import fitz  # PyMuPDF
 from docx import Document
-import tempfile
-def extract_file_content(service, file_id, mime_type) -> str:
-    """
-    Extracts first ~200 words from PDF or DOCX.
-    Skips unsupported types like images/videos.
-    Limits extraction to keep processing fast even with 100+ files.
-    """
-    try:
-        metadata = service.files().get(fileId=file_id, fields="size, name").execute()
-        if int(metadata.get('size', 0)) > 10_000_000:
-            print(f"Skipping large file: {metadata['name']}")
-            return ""
 
-        content = ""
+from config.cache import cache
+from config.setting import OPENAI_KEY
+from .drive_service import build_drive_service
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".bin") as tmp_file:
-            tmp_path = tmp_file.name
-            request = service.files().get_media(fileId=file_id)
-            downloader = MediaIoBaseDownload(tmp_file, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
+# Snippets are keyed by modifiedTime, so they never go stale; the TTL only bounds disk use
+CONTENT_CACHE_TIMEOUT = 7 * 86400
 
-        if mime_type == 'application/pdf':
-            pdf_path = tmp_path.replace(".bin", ".pdf")
-            os.rename(tmp_path, pdf_path)
-            doc = fitz.open(pdf_path)
+PDF_MIME_TYPE = 'application/pdf'
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
 
-            words = []
-            for page in doc:
-                text = page.get_text()
-                words.extend(text.split())
-                if len(words) >= 200:
-                    break
-            doc.close()
-            os.remove(pdf_path)
-            content = " ".join(words[:200])
-
-        elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            docx_path = tmp_path.replace(".bin", ".docx")
-            os.rename(tmp_path, docx_path)
-            doc = Document(docx_path)
-
-            words = []
-            for para in doc.paragraphs:
-                words.extend(para.text.split())
-                if len(words) >= 200:
-                    break
-            os.remove(docx_path)
-            content = " ".join(words[:200])
+# Only these types are ever downloaded; anything else (images, video, ...) never leaves Drive
+SUPPORTED_MIME_TYPES = (PDF_MIME_TYPE, DOCX_MIME_TYPE)
 
-        else:
-            os.remove(tmp_path)
-            return ""  # Skip non-text files (image, video, etc.)
+# PDFs are streamed in ranged chunks so we can stop as soon as the snippet is complete;
+# 512 KB usually covers the first page of a typical report in a single request
+PDF_CHUNK_SIZE = 512 * 1024
+# Ranged chunks parsed before giving up on an early stop; scanned or very short PDFs never
+# fill the snippet, so the remaining bytes are fetched in one ranged request and parsed once
+PDF_MAX_PARTIAL_PARSES = 2
 
-        return content.strip()
+# Partial buffers are expected to be malformed; keep MuPDF from printing every failed attempt
+# (failures still raise and are logged by extract_file_content)
+fitz.TOOLS.mupdf_display_errors(False)
 
-    except Exception as e:
-        print(f"[extract_file_content] Error for {file_id}: {e}")
-        return ""
+# The snippet comes from the first pages only; later pages are never loaded
+PDF_MAX_PAGES = 2
+# Text-only extraction: no images, joined hyphenated line breaks
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_MEDIABOX_CLIP | fitz.TEXT_DEHYPHENATE
+
+def _pdf_words(data: bytes) -> Tuple[List[str], bool]:
+    """Return the first 200 words of a (possibly truncated) PDF and whether MuPDF had to repair it"""
+    doc = fitz.open(stream=data, filetype='pdf')
+
+    words = []
+    try:
+        # A repaired document was reconstructed from a partial buffer, so later pages may be missing
+        repaired = doc.is_repaired
+        for pno in range(min(PDF_MAX_PAGES, doc.page_count)):
+            # "words" yields pre-tokenized (x0, y0, x1, y1, word, ...) tuples, no full-page string
+            for w in doc.load_page(pno).get_text("words", flags=PDF_TEXT_FLAGS):
+                words.append(w[4])
+                if len(words) >= 200:
+                    return words, repaired
+    finally:
+        doc.close()
+    return words, repaired
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Tabs and line breaks separate words just like spaces do (python-docx renders them as \t and \n)
+WORD_BREAK_TAGS = {WORD_NS + 'tab', WORD_NS + 'br', WORD_NS + 'cr'}
+
+def _docx_words(data: bytes) -> List[str]:
+    """Return the first 200 words of a DOCX by streaming word/document.xml"""
+    try:
+        words = []
+        with zipfile.ZipFile(io.BytesIO(data)) as archive, archive.open('word/document.xml') as xml:
+            for _, elem in ET.iterparse(xml, events=('end',)):
+                if elem.tag != WORD_NS + 'p':
+                    continue
+                # Runs split words arbitrarily, so join them per paragraph before splitting
+                parts = []
+                for node in elem.iter():
+                    if node.tag == WORD_NS + 't':
+                        parts.append(node.text or "")
+                    elif node.tag in WORD_BREAK_TAGS:
+                        parts.append(" ")
+                text = "".join(parts)
+                elem.clear()
+                words.extend(text.split())
+                if len(words) >= 200:
+                    break
+        return words[:200]
+
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        # Unexpected package layout: fall back to the full python-docx document model
+        doc = Document(io.BytesIO(data))
+
+        words = []
+        for para in doc.paragraphs:
+            words.extend(para.text.split())
+            if len(words) >= 200:
+                break
+        return words[:200]
+
+def _stream_pdf_words(service, file_id) -> List[str]:
+    """Download a PDF chunk by chunk and abort once 200 words can be parsed"""
+    buf = io.BytesIO()
+    downloader = MediaIoBaseDownload(buf, service.files().get_media(fileId=file_id), chunksize=PDF_CHUNK_SIZE)
+
+    for _ in range(PDF_MAX_PARTIAL_PARSES):
+        status, done = downloader.next_chunk()
+        try:
+            words, repaired = _pdf_words(buf.getvalue())
+        except fitz.FileDataError:
+            if done:
+                raise
+            continue  # Not enough of the file yet to open it
+        # A short snippet is only final once the buffer parses as a complete, unrepaired PDF
+        if len(words) >= 200 or not repaired or done:
+            return words
+
+    # No early stop: fetch everything after the bytes already buffered in one request
+    # instead of re-parsing a growing buffer
+    rest = service.files().get_media(fileId=file_id)
+    rest.headers['Range'] = f"bytes={buf.tell()}-"
+    buf.write(rest.execute())
+    words, _ = _pdf_words(buf.getvalue())
+    return words
+
+def extract_file_content(service, file_id, mime_type, metadata: Optional[Dict[str, Any]] = None) -> str:
     """
     Extracts first ~200 words from PDF or DOCX.
     Skips unsupported types like images/videos.
     Limits extraction to keep processing fast even with 100+ files.
+    Results are cached per (file_id, modifiedTime), so edits invalidate automatically.
+    Pass metadata (name, size, modifiedTime) when already known to skip the metadata GET.
     """
+    if mime_type not in SUPPORTED_MIME_TYPES:
+        return ""  # Skip non-text files (image, video, etc.)
+
     try:
-        # Download the file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".bin") as tmp_file:
-            tmp_path = tmp_file.name
-            request = service.files().get_media(fileId=file_id)
-            file_data = request.execute()
-            tmp_file.write(file_data)
-
-        content = ""
-
-        if mime_type == 'application/pdf':
-            pdf_path = tmp_path.replace(".bin", ".pdf")
-            os.rename(tmp_path, pdf_path)
-            doc = fitz.open(pdf_path)
-
-            words = []
-            for page in doc:
-                text = page.get_text()
-                words.extend(text.split())
-                if len(words) >= 200:
-                    break
-            doc.close()
-            os.remove(pdf_path)
-            content = " ".join(words[:200])
-
-        elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            docx_path = tmp_path.replace(".bin", ".docx")
-            os.rename(tmp_path, docx_path)
-            doc = Document(docx_path)
-
-            words = []
-            for para in doc.paragraphs:
-                words.extend(para.text.split())
-                if len(words) >= 200:
-                    break
-            os.remove(docx_path)
-            content = " ".join(words[:200])
+        if metadata is None:
+            metadata = service.files().get(fileId=file_id, fields="size, name, modifiedTime").execute()
+        if int(metadata.get('size') or 0) > 10_000_000:
+            print(f"Skipping large file: {metadata['name']}")
+            return ""
+
+        cache_key = f"content:{file_id}:{metadata.get('modifiedTime')}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if mime_type == PDF_MIME_TYPE:
+            content = " ".join(_stream_pdf_words(service, file_id))
 
         else:
-            os.remove(tmp_path)
-            return ""  # Skip non-text files (image, video, etc.)
+            # The zip central directory sits at the end of a DOCX, so it has to be downloaded in full
+            file_bytes = service.files().get_media(fileId=file_id).execute()
+            content = " ".join(_docx_words(file_bytes))
 
-        return content.strip()
+        content = content.strip()
+        cache.set(cache_key, content, timeout=CONTENT_CACHE_TIMEOUT)
+        return content
 
     except Exception as e:
         print(f"[extract_file_content] Error for {file_id}: {e}")
@@ -126,28 +168,87 @@ def extract_file_content(service, file_id, mime_type) -> str:
 
 ai_bp = Blueprint("ai_organizer", __name__)
 
-# Initialize OpenAI client
-openai_api = os.environ.get("OPENAI_KEY")
-client = OpenAI(api_key=openai_api)
+# Drive calls are network-bound, so per-file work is fanned out over a thread pool
+MAX_DRIVE_WORKERS = 16
+# Writes (renames/moves) are throttled harder per user by Drive, so they get a smaller pool
+MAX_DRIVE_WRITE_WORKERS = 10
 
+_thread_local = threading.local()
 
-def generate_file_rename_prompt(file_list: List[Dict[str, Any]], pattern: str) -> str:
-    """Generate a detailed prompt for AI file organization"""
+def _init_drive_worker(creds_data: Dict[str, Any]):
+    """Give each pool thread its own Drive service (httplib2 is not thread-safe)"""
+    _thread_local.service = build_drive_service(Credentials(**creds_data))
 
-    files_text = ""
-    for i, file in enumerate(file_list, 1):
-        files_text += f"{i}. {file['name']} ({file['type']})\n"    
+def drive_pool_map(func: Callable, items: List[Any], creds_data: Dict[str, Any],
+                   max_workers: int = MAX_DRIVE_WORKERS) -> List[Any]:
+    """Run func(service, item) for every item concurrently, preserving input order"""
+    if not items:
+        return []
 
-    prompt = f"""
-You are a professional AI assistant and expert file organizer. I have {len(file_list)} files and folders that need to be cleaned, renamed, and optionally organized into a more meaningful folder structure.
+    # Workers need an app context for extensions such as the content cache
+    app = current_app._get_current_object()
+
+    def run(item):
+        with app.app_context():
+            return func(_thread_local.service, item)
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)),
+        initializer=_init_drive_worker,
+        initargs=(creds_data,)
+    ) as executor:
+        return list(executor.map(run, items))
+
+# Drive accepts at most 100 sub-requests per batched HTTP call
+DRIVE_BATCH_LIMIT = 100
+
+def batch_get_metadata(service, file_ids: List[str], fields: str) -> Dict[str, Dict[str, Any]]:
+    """Fetch metadata for many files using batched HTTP requests instead of one GET per file"""
+    metadata = {}
+
+    def callback(request_id, response, exception):
+        if exception:
+            print(f"[batch_get_metadata] Error for {request_id}: {exception}")
+            return
+        metadata[request_id] = response
+
+    unique_ids = list(dict.fromkeys(file_ids))
+    for i in range(0, len(unique_ids), DRIVE_BATCH_LIMIT):
+        chunk = unique_ids[i:i + DRIVE_BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=callback)
+        for file_id in chunk:
+            batch.add(service.files().get(fileId=file_id, fields=fields), request_id=file_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            # Leave the chunk out; callers treat missing ids as per-file failures
+            print(f"[batch_get_metadata] Batch failed for {len(chunk)} files: {e}")
+
+    return metadata
+
+# Initialize OpenAI client once; it pools connections across requests and threads.
+# The key is validated at startup by config.setting. Bounded timeouts keep a hung call
+# from pinning a worker, and the built-in retries back off on 429s.
+client = OpenAI(
+    api_key=OPENAI_KEY,
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    max_retries=2
+)
+
+
+# Stable instruction block sent as the system message. It must stay identical across calls
+# (no counts, patterns or user data) so OpenAI's automatic prompt caching can reuse the prefix.
+RENAME_RULES = """
+You are a professional AI assistant and expert file organizer. You will be given a list of files and folders that need to be cleaned, renamed, and optionally organized into a more meaningful folder structure.
 
 **Naming Instructions:**
-- Use this optional naming format if provided by the user: {pattern or 'No custom pattern given'}
+- Use the naming format given by the user, if one is provided
 - Follow common naming conventions like PascalCase or snake_case
 - Keep file extensions intact
 - Remove unnecessary characters, underscores, numbers, or redundant words
 - Avoid duplicate or conflicting names
 - Ensure clarity, readability, and relevance to content
+- When a content excerpt is given for a file, use it to infer what the file is about
 
 **Foldering Instructions:**
 - Group related files under folders such as Reports, Invoices, Projects, Chapters, etc.
@@ -164,50 +265,123 @@ For every file or folder, suggest:
 
 Respond strictly in the following JSON format:
 
-[
-  {{
-    "id": "original_file_id",
-    "currentName": "original_name.ext",
-    "newName": "Improved_File_Name.ext",
-    "newFolder": "Company/Department" (optional),
-    "type": "file" or "folder",
-    "reason": "Short explanation for the change"
-  }}
-]
+{
+  "suggestions": [
+    {
+      "currentName": "original_name.ext",
+      "newName": "Improved_File_Name.ext",
+      "newFolder": "Company/Department" (optional),
+      "type": "file" or "folder",
+      "reason": "Short explanation for the change"
+    }
+  ]
+}
 
 Only return valid JSON. Do not include markdown, commentary, or any additional text.
+"""
+
+# Renaming is mechanical string rewriting, which the smaller model handles at a fraction of the latency
+AI_MODEL = "gpt-4o-mini"
+
+# Structured output schema: the API guarantees responses that parse and match it
+RENAME_SUGGESTIONS_SCHEMA = {
+    "name": "rename_suggestions",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "suggestions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "currentName": {"type": "string"},
+                        "newName": {"type": "string"},
+                        "newFolder": {"type": ["string", "null"]},
+                        "type": {"type": "string", "enum": ["file", "folder"]},
+                        "reason": {"type": "string"}
+                    },
+                    "required": ["currentName", "newName", "newFolder", "type", "reason"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["suggestions"],
+        "additionalProperties": False
+    }
+}
+
+# Characters of extracted content included per file; enough to identify the subject
+CONTENT_PREVIEW_CHARS = 300
+
+PROMPT_TEMPLATE = """
+I have {count} files and folders to organize.
+
+Naming format requested by the user: {pattern}
+
 Here is the list of files/folders:
 
-{files_text}
+{files}
 """
 
-    return prompt
+def _format_file_entry(i: int, file: Dict[str, Any]) -> str:
+    entry = f"{i}. {file['name']} ({file['type']})\n"
+    content = file.get('content', '')[:CONTENT_PREVIEW_CHARS]
+    if content:
+        entry += f"   Content excerpt: {content}\n"
+    return entry
+
+def generate_file_rename_prompt(file_list: List[Dict[str, Any]], pattern: str) -> str:
+    """Generate the per-request part of the prompt (the rules live in RENAME_RULES)"""
+    files_text = "".join(_format_file_entry(i, file) for i, file in enumerate(file_list, 1))
+
+    return PROMPT_TEMPLATE.format(
+        count=len(file_list),
+        pattern=pattern or 'No custom pattern given',
+        files=files_text
+    )
 
-def get_ai_suggestions(prompt: str) -> List[Dict[str, Any]]:
+# Output budget: ~80 tokens per suggestion object plus slack for the wrapper
+TOKENS_PER_SUGGESTION = 80
+MAX_OUTPUT_TOKENS = 2000
+
+# Identical prompts (same files, content and pattern) reuse the previous answer for an hour
+AI_CACHE_TIMEOUT = 3600
+
+# Low temperature keeps suggestions stable across re-previews, which also suits the cache
+AI_TEMPERATURE = 0.2
+
+# Everything besides the prompt that shapes the answer; changing any of it invalidates old entries
+AI_CACHE_VERSION = hashlib.sha256(
+    f"{AI_MODEL}{AI_TEMPERATURE}{RENAME_RULES}{json.dumps(RENAME_SUGGESTIONS_SCHEMA, sort_keys=True)}".encode()
+).hexdigest()[:16]
+
+def get_ai_suggestions(prompt: str, file_count: int) -> List[Dict[str, Any]]:
     """Get AI suggestions for file organization"""
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    cache_key = f"rename:{AI_CACHE_VERSION}:{prompt_hash}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
         response = client.chat.completions.create(
-            model="gpt-4o",
+            model=AI_MODEL,
             messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a professional file organizer. Always respond with valid JSON only."
-                },
+                {"role": "system", "content": RENAME_RULES},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
-            max_tokens=1000
+            temperature=AI_TEMPERATURE,
+            max_tokens=min(MAX_OUTPUT_TOKENS, TOKENS_PER_SUGGESTION * file_count + 200),
+            # Structured outputs guarantee schema-valid JSON, so no markdown fences to strip
+            response_format={"type": "json_schema", "json_schema": RENAME_SUGGESTIONS_SCHEMA}
         )
         
-        content = response.choices[0].message.content.strip()
-        
-        # Clean up the response to ensure it's valid JSON
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
+        content = response.choices[0].message.content
         
-        suggestions = json.loads(content)
+        suggestions = json.loads(content).get('suggestions', [])
+        if suggestions:
+            cache.set(cache_key, suggestions, timeout=AI_CACHE_TIMEOUT)
         return suggestions
         
     except json.JSONDecodeError as e:
@@ -218,37 +392,148 @@ def get_ai_suggestions(prompt: str) -> List[Dict[str, Any]]:
         print(f"OpenAI API error: {e}")
         return []
 
-def create_folder_if_not_exists(service, folder_name: str, parent_id: str = None) -> str:
+# Large selections are split into shards that are sent to the model concurrently;
+# small shards also keep each response well under max_tokens
+AI_SHARD_SIZE = 20
+MAX_AI_WORKERS = 8
+
+def get_sharded_ai_suggestions(file_list: List[Dict[str, Any]], pattern: str) -> List[Dict[str, Any]]:
+    """Get AI suggestions for any number of files, one concurrent model call per shard"""
+    if not file_list:
+        return []
+
+    shards = [file_list[i:i + AI_SHARD_SIZE] for i in range(0, len(file_list), AI_SHARD_SIZE)]
+    app = current_app._get_current_object()
+
+    def suggest(shard):
+        with app.app_context():
+            suggestions = get_ai_suggestions(generate_file_rename_prompt(shard, pattern), len(shard))
+
+        # The model may skip files, so match suggestions back by name rather than position;
+        # files sharing a name are assigned in order
+        ids_by_name = {}
+        for f in shard:
+            ids_by_name.setdefault(f['name'], []).append(f['id'])
+
+        matched = []
+        for suggestion in suggestions:
+            ids = ids_by_name.get(suggestion.get('currentName'))
+            if not ids:
+                print(f"Dropping suggestion for unknown file: {suggestion.get('currentName')}")
+                continue
+            suggestion['id'] = ids.pop(0)
+            matched.append(suggestion)
+        return matched
+
+    with ThreadPoolExecutor(max_workers=min(MAX_AI_WORKERS, len(shards))) as executor:
+        return [suggestion for shard_suggestions in executor.map(suggest, shards) for suggestion in shard_suggestions]
+
+def escape_query_value(value: str) -> str:
+    """Escape a literal for a Drive query string (e.g. "Client's Reports")"""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+# Request-scoped memo of resolved folders, keyed by (parent_id, folder_name)
+FolderCache = Dict[Tuple[Optional[str], str], str]
+
+# How many names go into a single OR-joined folder lookup (keeps the query URL short)
+FOLDER_QUERY_CHUNK = 50
+
+def prefetch_folders(service, folder_paths: List[str], folder_cache: FolderCache) -> Set[str]:
+    """
+    Look up every folder name used by folder_paths with a few OR-joined queries.
+    Returns the names that were fully scanned: for those, a (parent, name) key missing from
+    folder_cache means no such folder exists.
+    """
+    names = sorted({
+        segment.strip()
+        for path in folder_paths
+        for segment in path.split('/')
+        if segment.strip()
+    })
+    scanned = set()
+
+    for i in range(0, len(names), FOLDER_QUERY_CHUNK):
+        chunk = names[i:i + FOLDER_QUERY_CHUNK]
+        # Drive matches name= case-insensitively; key results by the names that were asked for
+        requested = {}
+        for name in chunk:
+            requested.setdefault(name.lower(), []).append(name)
+        name_clause = " or ".join(f"name='{escape_query_value(name)}'" for name in chunk)
+        query = f"mimeType='application/vnd.google-apps.folder' and trashed=false and ({name_clause})"
+
+        try:
+            page_token = None
+            while True:
+                response = service.files().list(
+                    q=query,
+                    fields='nextPageToken, files(id, name, parents)',
+                    pageSize=1000,
+                    pageToken=page_token
+                ).execute()
+
+                for folder in response.get('files', []):
+                    for name in requested.get(folder['name'].lower(), []):
+                        # A lookup without a parent matches the folder anywhere, as the unscoped query does
+                        folder_cache.setdefault((None, name), folder['id'])
+                        for pid in folder.get('parents', []):
+                            folder_cache.setdefault((pid, name), folder['id'])
+
+                page_token = response.get('nextPageToken', None)
+                if page_token is None:
+                    break
+            scanned.update(chunk)
+        except Exception as e:
+            # Not fatal: create_folder_if_not_exists falls back to one lookup per segment
+            print(f"Error prefetching folders: {e}")
+
+    return scanned
+
+def create_folder_if_not_exists(service, folder_name: str, parent_id: str = None,
+                                folder_cache: Optional[FolderCache] = None,
+                                prefetched_names: Optional[Set[str]] = None) -> str:
     """Create a folder in Google Drive if it doesn't exist"""
+    if folder_cache is not None and (parent_id, folder_name) in folder_cache:
+        return folder_cache[(parent_id, folder_name)]
+
     try:
-        # Check if folder already exists
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        if parent_id:
-            query += f" and '{parent_id}' in parents"
-        
-        results = service.files().list(q=query).execute()
-        items = results.get('files', [])
+        items = []
+        # A prefetched name missing from the cache is known not to exist under this parent
+        if folder_cache is None or folder_name not in (prefetched_names or ()):
+            # Check if folder already exists
+            query = f"name='{escape_query_value(folder_name)}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            if parent_id:
+                query += f" and '{parent_id}' in parents"
+
+            # Only the first match is used, so ask for just its id
+            results = service.files().list(q=query, fields='files(id)', pageSize=1).execute()
+            items = results.get('files', [])
         
         if items:
-            return items[0]['id']
-        
-        # Create new folder
-        folder_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
-        }
-        
-        if parent_id:
-            folder_metadata['parents'] = [parent_id]
-        
-        folder = service.files().create(body=folder_metadata, fields='id').execute()
-        return folder.get('id')
+            folder_id = items[0]['id']
+        else:
+            # Create new folder
+            folder_metadata = {
+                'name': folder_name,
+                'mimeType': 'application/vnd.google-apps.folder'
+            }
+            
+            if parent_id:
+                folder_metadata['parents'] = [parent_id]
+            
+            folder = service.files().create(body=folder_metadata, fields='id').execute()
+            folder_id = folder.get('id')
+
+        if folder_cache is not None and folder_id:
+            folder_cache[(parent_id, folder_name)] = folder_id
+        return folder_id
         
     except Exception as e:
         print(f"Error creating folder {folder_name}: {e}")
         return None
 
-def create_nested_folders(service, folder_path: str, parent_id: str = None) -> str:
+def create_nested_folders(service, folder_path: str, parent_id: str = None,
+                          folder_cache: Optional[FolderCache] = None,
+                          prefetched_names: Optional[Set[str]] = None) -> str:
     """Create nested folders based on path like 'Course_Materials/Chapters'"""
     if not folder_path:
         return parent_id
@@ -259,14 +544,95 @@ def create_nested_folders(service, folder_path: str, parent_id: str = None) -> s
     for folder_name in folders:
         folder_name = folder_name.strip()
         if folder_name:
-            current_parent = create_folder_if_not_exists(service, folder_name, current_parent)
+            current_parent = create_folder_if_not_exists(service, folder_name, current_parent, folder_cache,
+                                                         prefetched_names)
             if not current_parent:
                 return None
     
     return current_parent
 
+def delete_empty_folders(service, folder_ids: Set[str]):
+    """Delete the folders left without children, using OR-joined child lookups and batched deletes"""
+    folder_ids = list(folder_ids)
+    non_empty = set()
+
+    for i in range(0, len(folder_ids), FOLDER_QUERY_CHUNK):
+        chunk = folder_ids[i:i + FOLDER_QUERY_CHUNK]
+        parents_clause = " or ".join(f"'{fid}' in parents" for fid in chunk)
+
+        try:
+            page_token = None
+            while True:
+                response = service.files().list(
+                    q=f"({parents_clause}) and trashed=false",
+                    fields='nextPageToken, files(parents)',
+                    pageSize=1000,
+                    pageToken=page_token
+                ).execute()
+
+                for child in response.get('files', []):
+                    non_empty.update(child.get('parents', []))
+
+                page_token = response.get('nextPageToken', None)
+                # Stop paging once every folder in the chunk is known to have children
+                if page_token is None or non_empty.issuperset(chunk):
+                    break
+        except Exception as e:
+            print(f"⚠️ Failed to check folders {chunk}: {e}")
+            non_empty.update(chunk)  # never delete what we could not verify
+
+    def callback(request_id, response, exception):
+        if exception:
+            print(f"⚠️ Failed to delete folder {request_id}: {exception}")
+        else:
+            print(f"✅ Deleted empty folder: {request_id}")
+
+    empty = [fid for fid in folder_ids if fid not in non_empty]
+    for i in range(0, len(empty), DRIVE_BATCH_LIMIT):
+        chunk = empty[i:i + DRIVE_BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=callback)
+        for fid in chunk:
+            batch.add(service.files().delete(fileId=fid), request_id=fid)
+        try:
+            batch.execute()
+        except Exception as e:
+            # Cleanup is best effort; the renames have already been applied
+            print(f"⚠️ Failed to delete folders {chunk}: {e}")
+
+def _enrich(service, f: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch a content snippet for a single selected file whose mimeType is already known.
+    For files, f must be built from a Drive response (files.get/list), never from the request
+    payload: its modifiedTime is trusted as the content cache key.
+    """
+    file_id = f['id']
+    mime_type = f.get('mimeType')
+    metadata = f if 'modifiedTime' in f else None
+    content = ""
+    if f['type'] == 'file' and mime_type in SUPPORTED_MIME_TYPES:
+        content = extract_file_content(service, file_id, mime_type, metadata)
+    return {
+        "id": file_id,
+        "name": f['name'],
+        "type": f['type'],
+        "content": content
+    }
+
+def _has_content(f: Dict[str, Any]) -> bool:
+    return f['type'] == 'file' and f.get('mimeType') in SUPPORTED_MIME_TYPES
+
+def enrich_files(files: List[Dict[str, Any]], creds_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Add content snippets, spinning up Drive workers only for files that have extractable content"""
+    extracted = iter(drive_pool_map(_enrich, [f for f in files if _has_content(f)], creds_data))
+    return [
+        next(extracted) if _has_content(f)
+        else {"id": f['id'], "name": f['name'], "type": f['type'], "content": ""}
+        for f in files
+    ]
+
 @ai_bp.route('/ai/rename-preview', methods=['POST'])
 def ai_rename_preview():
+    """Generate AI suggestions for file renaming and organization"""
     try:
         if 'credentials' not in session:
             return jsonify({"error": "Not authorized"}), 401
@@ -277,63 +643,97 @@ def ai_rename_preview():
         if not selected_files:
             return jsonify({"error": "No files selected"}), 400
 
-        creds = Credentials(**session['credentials'])
-        service = build('drive', 'v3', credentials=creds)
-
-        enriched_files = []
-        for f in selected_files:
-            file_id = f['id']
-            mime_type = service.files().get(fileId=file_id, fields="mimeType").execute()['mimeType']
-            content = extract_file_content(service, file_id, mime_type) if f['type'] == 'file' else ""
-            enriched_files.append({
-                "id": file_id,
-                "name": f['name'],
-                "type": f['type'],
-                "content": content
-            })
+        # One batched metadata call up front leaves each worker with just the media download
+        file_ids = [f['id'] for f in selected_files if f['type'] == 'file']
+        metadata = {}
+        if file_ids:
+            creds = Credentials(**session['credentials'])
+            service = build_drive_service(creds)
+            metadata = batch_get_metadata(service, file_ids, 'id, name, mimeType, size, modifiedTime')
+
+        # File entries come only from Drive's response; ids the caller cannot read are dropped,
+        # so client-supplied mimeType/modifiedTime never reach the shared content cache
+        selected_files = [
+            {'type': 'file', **metadata[f['id']]} if f['type'] == 'file'
+            else {'id': f['id'], 'name': f['name'], 'type': f['type']}
+            for f in selected_files
+            if f['type'] != 'file' or f['id'] in metadata
+        ]
+        if not selected_files:
+            return jsonify({"error": "None of the selected files could be read"}), 400
 
-        prompt = generate_file_rename_prompt(enriched_files, pattern)
-        suggestions = get_ai_suggestions(prompt)
+        enriched_files = enrich_files(selected_files, session['credentials'])
 
-        for i, suggestion in enumerate(suggestions):
-            if i < len(enriched_files):
-                suggestion['id'] = enriched_files[i]['id']
+        suggestions = get_sharded_ai_suggestions(enriched_files, pattern)
 
         return jsonify(suggestions)
     except Exception as e:
         print(f"Error in ai_rename_preview: {e}")
         return jsonify({"error": str(e)}), 500
 
-    """Generate AI suggestions for file renaming and organization"""
+def _apply_suggestion(service, suggestion: Dict[str, Any], folder_ids: Dict[str, str],
+                      file_metadata: Dict[str, Dict[str, Any]]):
+    """Rename/move a single file; returns (result, previous_parents)"""
+    previous_parents = []
     try:
-        if 'credentials' not in session:
-            return jsonify({"error": "Not authorized"}), 401
-        
-        data = request.get_json()
-        selected_files = data.get('selectedFiles', [])
-        
-        if not selected_files:
-            return jsonify({"error": "No files selected"}), 400
-        
-        # Generate AI prompt
-        prompt = generate_file_rename_prompt(selected_files)
-        
-        # Get AI suggestions
-        suggestions = get_ai_suggestions(prompt)
-        
-        if not suggestions:
-            return jsonify({"error": "Failed to generate AI suggestions"}), 500
-        
-        # Add original IDs to suggestions
-        for i, suggestion in enumerate(suggestions):
-            if i < len(selected_files):
-                suggestion['id'] = selected_files[i]['id']
-        
-        return jsonify(suggestions)
-        
+        file_id = suggestion['id']
+        new_name = suggestion['newName']
+        new_folder_path = suggestion.get('newFolder')
+        update_metadata = {'name': new_name}
+
+        if new_folder_path:
+            folder_id = folder_ids.get(new_folder_path)
+
+            if folder_id:
+                # Old parents are only needed to move the file (prefetched in one batch)
+                if file_id not in file_metadata:
+                    raise ValueError(f"Could not fetch metadata for {file_id}")
+                previous_parents = file_metadata[file_id].get('parents', [])
+
+                service.files().update(
+                    fileId=file_id,
+                    body=update_metadata,
+                    addParents=folder_id,
+                    removeParents=','.join(previous_parents) if previous_parents else None,
+                    fields='id, name, parents'
+                ).execute()
+
+                return {
+                    'id': file_id,
+                    'status': 'success',
+                    'message': f'Renamed to \"{new_name}\" and moved to \"{new_folder_path}\"'
+                }, previous_parents
+
+            service.files().update(
+                fileId=file_id,
+                body=update_metadata,
+                fields='id, name'
+            ).execute()
+
+            return {
+                'id': file_id,
+                'status': 'partial',
+                'message': f'Renamed to \"{new_name}\" but folder creation failed'
+            }, previous_parents
+
+        service.files().update(
+            fileId=file_id,
+            body=update_metadata,
+            fields='id, name'
+        ).execute()
+
+        return {
+            'id': file_id,
+            'status': 'success',
+            'message': f'Renamed to \"{new_name}\"'
+        }, previous_parents
+
     except Exception as e:
-        print(f"Error in ai_rename_preview: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {
+            'id': suggestion.get('id', 'unknown'),
+            'status': 'error',
+            'message': f'Error: {str(e)}'
+        }, previous_parents
 
 @ai_bp.route('/ai/execute-rename', methods=['POST'])
 def execute_rename():
@@ -349,86 +749,39 @@ def execute_rename():
             return jsonify({"error": "No suggestions provided"}), 400
 
         creds = Credentials(**session['credentials'])
-        service = build('drive', 'v3', credentials=creds)
+        service = build_drive_service(creds)
+
+        # Resolve every target folder up front so concurrent workers never race to create the same one
+        folder_paths = {s.get('newFolder') for s in suggestions if s.get('newFolder')}
+        folder_cache: FolderCache = {}
+        prefetched_names = prefetch_folders(service, list(folder_paths), folder_cache)
+        folder_ids = {
+            path: create_nested_folders(service, path, folder_cache=folder_cache,
+                                        prefetched_names=prefetched_names)
+            for path in folder_paths
+        }
 
-        results = []
-        touched_folders = set()
+        # Plain renames go straight to files.update; only moves need the current parents
+        file_metadata = batch_get_metadata(
+            service,
+            [s['id'] for s in suggestions if 'id' in s and folder_ids.get(s.get('newFolder'))],
+            'id, parents'
+        )
 
-        for suggestion in suggestions:
-            try:
-                file_id = suggestion['id']
-                new_name = suggestion['newName']
-                new_folder_path = suggestion.get('newFolder')
-                update_metadata = {'name': new_name}
-
-                file_info = service.files().get(fileId=file_id, fields='parents').execute()
-                previous_parents = file_info.get('parents', [])
-                if previous_parents:
-                    touched_folders.update(previous_parents)
-
-                if new_folder_path:
-                    folder_id = create_nested_folders(service, new_folder_path)
-
-                    if folder_id:
-                        service.files().update(
-                            fileId=file_id,
-                            body=update_metadata,
-                            addParents=folder_id,
-                            removeParents=','.join(previous_parents) if previous_parents else None,
-                            fields='id, name, parents'
-                        ).execute()
-
-                        results.append({
-                            'id': file_id,
-                            'status': 'success',
-                            'message': f'Renamed to \"{new_name}\" and moved to \"{new_folder_path}\"'
-                        })
-                    else:
-                        service.files().update(
-                            fileId=file_id,
-                            body=update_metadata,
-                            fields='id, name'
-                        ).execute()
-
-                        results.append({
-                            'id': file_id,
-                            'status': 'partial',
-                            'message': f'Renamed to \"{new_name}\" but folder creation failed'
-                        })
-                else:
-                    service.files().update(
-                        fileId=file_id,
-                        body=update_metadata,
-                        fields='id, name'
-                    ).execute()
-
-                    results.append({
-                        'id': file_id,
-                        'status': 'success',
-                        'message': f'Renamed to \"{new_name}\"'
-                    })
-
-            except Exception as e:
-                results.append({
-                    'id': suggestion.get('id', 'unknown'),
-                    'status': 'error',
-                    'message': f'Error: {str(e)}'
-                })
+        outputs = drive_pool_map(
+            functools.partial(_apply_suggestion, folder_ids=folder_ids, file_metadata=file_metadata),
+            suggestions,
+            session['credentials'],
+            max_workers=MAX_DRIVE_WRITE_WORKERS
+        )
+
+        results = [result for result, _ in outputs]
+        touched_folders = set()
+        for _, previous_parents in outputs:
+            touched_folders.update(previous_parents)
 
         # 🔥 Delete empty folders
-        for folder_id in touched_folders:
-            try:
-                children = service.files().list(
-                    q=f"'{folder_id}' in parents and trashed=false",
-                    fields='files(id)',
-                    pageSize=1
-                ).execute().get('files', [])
-                
-                if not children:
-                    service.files().delete(fileId=folder_id).execute()
-                    print(f"✅ Deleted empty folder: {folder_id}")
-            except Exception as e:
-                print(f"⚠️ Failed to check/delete folder {folder_id}: {e}")
+        delete_empty_folders(service, touched_folders)
 
         return jsonify({
             'success': True,
@@ -452,17 +805,18 @@ def batch_organize():
         
         data = request.get_json()
         folder_id = data.get('folderId')
+        pattern = data.get('pattern', "")
         
         if not folder_id:
             return jsonify({"error": "No folder ID provided"}), 400
         
         creds = Credentials(**session['credentials'])
-        service = build('drive', 'v3', credentials=creds)
+        service = build_drive_service(creds)
         
         # Get all files in the folder
         results = service.files().list(
             q=f"'{folder_id}' in parents and trashed=false",
-            fields='files(id, name, mimeType)'
+            fields='files(id, name, mimeType, size, modifiedTime)'
         ).execute()
         
         files = results.get('files', [])
@@ -477,21 +831,20 @@ def batch_organize():
             selected_files.append({
                 'id': file['id'],
                 'name': file['name'],
-                'type': file_type
+                'type': file_type,
+                'mimeType': file['mimeType'],
+                'size': file.get('size'),
+                'modifiedTime': file.get('modifiedTime')
             })
         
+        enriched_files = enrich_files(selected_files, session['credentials'])
+
         # Generate AI suggestions
-        prompt = generate_file_rename_prompt(selected_files)
-        suggestions = get_ai_suggestions(prompt)
+        suggestions = get_sharded_ai_suggestions(enriched_files, pattern)
         
         if not suggestions:
             return jsonify({"error": "Failed to generate AI suggestions"}), 500
         
-        # Add original IDs to suggestions
-        for i, suggestion in enumerate(suggestions):
-            if i < len(selected_files):
-                suggestion['id'] = selected_files[i]['id']
-        
         return jsonify({
             'suggestions': suggestions,
             'total_files': len(files)
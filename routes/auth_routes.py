@@ -3,6 +3,7 @@ import google_auth_oauthlib.flow
 import os
 from google.oauth2.credentials import Credentials
 import google_auth_oauthlib.flow
+from config.setting import FRONTEND_URL
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '0'  # only in development mode
 
@@ -23,7 +24,7 @@ def authorize():
         os.environ["GOOGLE_CLIENT_SECRET_FILE"], SCOPES)
     flow.redirect_uri = os.environ.get("REDIRECT_URI", url_for('auth.oauth2callback', _external=True))
     print("🔁 REDIRECT_URI:", flow.redirect_uri)
-    print("🌍 FRONTEND_URL:", os.environ.get("FRONTEND_URL"))
+    print("🌍 FRONTEND_URL:", FRONTEND_URL)
 
     auth_url, state = flow.authorization_url(
         access_type='offline',
@@ -38,7 +39,7 @@ def authorize():
 @auth_bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(os.environ.get("FRONTEND_URL"))  # or to your login screen
+    return redirect(FRONTEND_URL)  # or to your login screen
 
 
 @auth_bp.route('/oauth2callback')
@@ -69,4 +70,4 @@ def oauth2callback():
         'scopes': creds.scopes
     }
 
-    return redirect(f"{os.environ.get('FRONTEND_URL')}/dashboard?drive_connected=1")
\ No newline at end of file
+    return redirect(f"{FRONTEND_URL}/dashboard?drive_connected=1")
\ No newline at end of file
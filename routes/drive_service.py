@@ -0,0 +1,23 @@
+import json
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from google.oauth2.credentials import Credentials
+
+# The Drive v3 discovery document ships with google-api-python-client; parse it once at import
+# so build_drive_service() skips both the file read and the JSON decode.
+DRIVE_DISCOVERY_DOC = json.loads(discovery_cache.get_static_doc('drive', 'v3'))
+
+def _warm_up_resources(resource, resource_desc):
+    for name, child_desc in resource_desc.get('resources', {}).items():
+        _warm_up_resources(getattr(resource, name)(), child_desc)
+
+# Building a resource adds client-side parameters to the method descriptions in place. Doing it
+# once here means later builds, which may run concurrently, only reassign keys that already exist
+# instead of growing dicts that another build is iterating.
+_warm_up_resources(build_from_document(DRIVE_DISCOVERY_DOC, http=httplib2.Http()), DRIVE_DISCOVERY_DOC)
+
+def build_drive_service(creds: Credentials):
+    """Build a Drive v3 client; its authorized http keeps connections alive across calls"""
+    return build_from_document(DRIVE_DISCOVERY_DOC, credentials=creds)
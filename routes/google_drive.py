@@ -1,10 +1,26 @@
 from flask import Blueprint, request, jsonify,session
-from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
-import networkx as nx
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .drive_service import build_drive_service
 
 drive_bp = Blueprint("drive", __name__)
 
+def iter_file_pages(service, **list_kwargs):
+    """Yield files.list pages, fetching the next page in the background while the caller ingests the current one"""
+    def fetch(page_token):
+        return service.files().list(pageToken=page_token, **list_kwargs).execute()
+
+    # A single worker makes every call, so the (non thread-safe) service is never used concurrently
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch, None)
+        while future is not None:
+            response = future.result()
+            page_token = response.get('nextPageToken', None)
+            future = executor.submit(fetch, page_token) if page_token else None
+            yield response.get('files', [])
+
 @drive_bp.route("/drive/status")
 def drive_status():
     creds_data = session.get('credentials')
@@ -22,52 +38,46 @@ def report():
             return jsonify({"error": "Not authorized"}), 401
 
         creds = Credentials(**session['credentials'])
-        service = build('drive', 'v3', credentials=creds)
+        service = build_drive_service(creds)
 
+        # Ownership is already filtered server-side by the q clause, so owners isn't requested
         all_files = []
-        page_token = None
-        while True:
-            response = service.files().list(
-                q="'me' in owners and trashed = false",
-                spaces='drive',
-                fields='nextPageToken, files(id, name, mimeType, parents, owners)',
-                pageToken=page_token
-            ).execute()
-            all_files.extend(response.get('files', []))
-            page_token = response.get('nextPageToken', None)
-            if page_token is None:
-                break
-
-        my_files = [f for f in all_files if f.get('owners', [{}])[0].get('me', True)]
+        for files in iter_file_pages(
+            service,
+            q="'me' in owners and trashed = false",
+            spaces='drive',
+            pageSize=1000,
+            fields='nextPageToken, files(id, name, mimeType, parents)'
+        ):
+            all_files.extend(files)
 
         folder_map = {}
         file_info = {}
-        for f in my_files:
+        for f in all_files:
             file_info[f['id']] = {
                 'name': f['name'],
                 'mimeType': f['mimeType'],
                 'parents': f.get('parents', [])
             }
 
-        G = nx.DiGraph()
+        # Plain adjacency map; a real label always replaces an "Unknown Folder" placeholder
+        labels = {}
+        children = defaultdict(list)
         for fid, info in file_info.items():
             label = info['name']
             if info['mimeType'] == 'application/vnd.google-apps.folder':
                 label += ' (folder)'
             else:
                 label += f' ({info["mimeType"].split("/")[-1]})'
-            G.add_node(fid, label=label)
+            labels[fid] = label
 
             for pid in info['parents']:
-                if pid not in G:
-                    G.add_node(pid, label=f"Unknown Folder ({pid})")
-                G.add_edge(pid, fid)
+                labels.setdefault(pid, f"Unknown Folder ({pid})")
+                children[pid].append(fid)
 
         tree_data = {
-            node: {
-                'label': G.nodes[node]['label'],
-                'children': list(G.successors(node))
-            } for node in G.nodes
+            node: {'label': label, 'children': children.get(node, [])}
+            for node, label in labels.items()
         }
 
         return jsonify(tree_data)